@@ -0,0 +1,266 @@
+"""
+Offline micro-benchmarks for the scraping pipeline.
+
+    python bench.py extract [--rows 200] [--repeat 20] [--chromium PATH]
+    python bench.py engines [--queries 50] [--rows 200]
+    python bench.py blocking [--images 40] [--repeat 5]
+    python bench.py xlsx [--sizes 1000,10000,100000]
+    python bench.py ingest [--rows 50000]
+    python bench.py dates [--rows 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import threading
+import os
+import time
+import tracemalloc
+from datetime import timedelta
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from playwright.async_api import async_playwright
+
+import main
+
+
+def fixture_html(rows: int) -> str:
+    today = main.now_utc()
+    trs = []
+    for i in range(rows):
+        d = (today - timedelta(days=i % 120)).strftime("%b %d %Y")
+        trs.append(
+            f"<tr><td>{d}</td><td>2020 Prizm Justin Herbert Silver PSA 10 #{i}</td>"
+            f"<td>${100 + (i % 37)}.00</td></tr>"
+        )
+    return f"<html><body><table class='sales-table'><tbody>{''.join(trs)}</tbody></table></body></html>"
+
+
+async def bench_extract(rows: int, repeat: int, chromium: str = ""):
+    async with async_playwright() as p:
+        # --chromium / CHROMIUM_EXECUTABLE: use a system Chromium when Playwright's own build is missing
+        browser = await p.chromium.launch(headless=True, executable_path=chromium or None)
+        page = await browser.new_page()
+        await page.set_content(fixture_html(rows))
+        timings = {}
+        for mode in ("per_row", "evaluate"):
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                out = await main.extract_rows(page, "table tbody tr", mode=mode)
+            timings[mode] = (time.perf_counter() - t0) / repeat
+            print(f"extract mode={mode:<8} rows={len(out):<4} {timings[mode] * 1000:8.1f} ms/query")
+        saved = timings["per_row"] - timings["evaluate"]
+        print(f"extract saved {saved * 1000:.1f} ms/query ({timings['per_row'] / timings['evaluate']:.1f}x)")
+        await browser.close()
+
+
+def heavy_fixture_html(rows: int, images: int) -> str:
+    # Sales table plus the kind of weight the real page carries (images, a web font)
+    imgs = "".join(f"<img src='/asset/img{i}.png' width=64 height=64>" for i in range(images))
+    font = "<style>@font-face{font-family:f;src:url('/asset/font.woff2')} body{font-family:f}</style>"
+    return fixture_html(rows).replace("<body>", f"<head>{font}</head><body>{imgs}", 1)
+
+
+def serve_fixture(rows: int, html: str = "") -> ThreadingHTTPServer:
+    """Local stand-in for the 130point sales page (static HTML, no JS) and its assets."""
+    body = (html or fixture_html(rows)).encode()
+    asset = b"\0" * 256_000
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/asset/"):
+                ctype = "font/woff2" if self.path.endswith(".woff2") else "image/png"
+                payload = asset
+            else:
+                ctype = "text/html; charset=utf-8"
+                payload = body
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def bench_engines(queries: int, rows: int):
+    server = serve_fixture(rows)
+    main.SALES_URL = f"http://127.0.0.1:{server.server_port}/sales/?q={{query}}"
+    main.upstream_limiter = main.AdaptivePacer(rate=10_000, burst=10_000, min_rate=10_000, max_rate=10_000)
+    await main.browser_pool.start()
+    main.http_client = main.new_http_client()
+    try:
+        qs = [f"bench card {i} PSA 10" for i in range(queries)]
+        for engine in main.ENGINES:
+            main.result_cache = main.ResultCache(path="")
+            main.comp_store = main.CompStore(path="")
+            t0 = time.perf_counter()
+            _, stats = await main.scrape_queries(qs, engine=engine)
+            dt = time.perf_counter() - t0
+            print(
+                f"engine={engine:<8} queries={queries} {dt:7.2f} s total "
+                f"{dt / queries * 1000:8.1f} ms/query  {stats}"
+            )
+    finally:
+        await main.http_client.aclose()
+        await main.browser_pool.stop()
+        server.shutdown()
+
+
+async def bench_blocking(images: int, repeat: int):
+    server = serve_fixture(200, heavy_fixture_html(200, images))
+    url = f"http://127.0.0.1:{server.server_port}/sales/?q=bench"
+    await main.browser_pool.start()
+    try:
+        for enabled in (False, True):
+            main.BLOCK_RESOURCES = enabled
+            nav, heap = 0.0, 0
+            for _ in range(repeat):
+                async with main.browser_pool.page() as page:
+                    cdp = await page.context.new_cdp_session(page)
+                    await cdp.send("Performance.enable")
+                    t0 = time.perf_counter()
+                    await page.goto(url, wait_until="load")
+                    nav += time.perf_counter() - t0
+                    m = {x["name"]: x["value"] for x in (await cdp.send("Performance.getMetrics"))["metrics"]}
+                    heap += int(m.get("JSHeapTotalSize", 0))
+            print(
+                f"blocking={'on ' if enabled else 'off'} nav={nav / repeat * 1000:8.1f} ms "
+                f"js_heap={heap / repeat / 1e6:6.1f} MB"
+            )
+        print(main.resource_blocker.stats())
+    finally:
+        await main.browser_pool.stop()
+        server.shutdown()
+
+
+def priced_frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Item": [f"2020 Prizm Justin Herbert Silver #{i}" for i in range(n)],
+        "Grade": ["PSA 10"] * n,
+        "Avg Sold Price (90d, USD)": [123.45] * n,
+        "# Sold Comps (90d)": [12] * n,
+        "Source": [main.SOURCE_NAME] * n,
+        "Query Used": [main.sales_url(f"2020 Prizm Justin Herbert Silver #{i} PSA 10") for i in range(n)],
+        "Notes": [""] * n,
+    })
+
+
+def legacy_write(df: pd.DataFrame) -> int:
+    out = BytesIO()
+    with pd.ExcelWriter(out, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False)
+    return len(out.getvalue())
+
+
+def spooled_write(df: pd.DataFrame) -> int:
+    path = main.spool_workbook(df)
+    size = os.path.getsize(path)
+    os.unlink(path)
+    return size
+
+
+def bench_xlsx(sizes):
+    for n in sizes:
+        df = priced_frame(n)
+        for name, fn in (("BytesIO+ExcelWriter", legacy_write), ("write_only+spool", spooled_write)):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            size = fn(df)
+            dt = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"xlsx rows={n:<7} {name:<20} {dt:7.2f} s  peak={peak / 1e6:8.1f} MB  file={size / 1e6:6.1f} MB")
+
+
+def bench_ingest(rows: int):
+    df = priced_frame(rows)
+    for i in range(10):  # dealer sheets carry plenty of columns we never read
+        df[f"Extra {i}"] = [f"note {i}-{j}" for j in range(rows)]
+    path = main.spool_workbook(df)
+    with open(path, "rb") as f:
+        raw = f.read()
+    os.unlink(path)
+
+    readers = [
+        ("pd.read_excel (all cols)", lambda: pd.read_excel(BytesIO(raw))),
+        ("read_sheet (Item/Grade)", lambda: main.read_sheet(raw, "xlsx", main.INPUT_COLS)),
+    ]
+    csv_raw = df.to_csv(index=False).encode()
+    readers.append(("read_sheet csv (Item/Grade)", lambda: main.read_sheet(csv_raw, "csv", main.INPUT_COLS)))
+    for name, fn in readers:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"ingest rows={len(out):<7} {name:<28} {dt:7.2f} s  peak={peak / 1e6:8.1f} MB")
+
+
+def date_corpus(n: int):
+    # Row texts shaped like 130point sold rows (tab-separated cells as innerText gives them)
+    today = main.now_utc()
+    fmts = ["%b %d %Y", "%m/%d/%Y", "%Y-%m-%d %H:%M:%S", "%a %d %b %Y"]
+    out = []
+    for i in range(n):
+        d = (today - timedelta(days=i % 180)).strftime(fmts[i % len(fmts)])
+        out.append(f"{d}\t2020 Panini Prizm #{i % 300} Justin Herbert RC Silver PSA 10\t${100 + i % 50}.00\tBest Offer")
+    return out
+
+
+def bench_dates(rows: int):
+    corpus = date_corpus(rows)
+    for name, fn in (("dateutil fuzzy", main.parse_date_fuzzy), ("parse_date", main.parse_date)):
+        main._parse_date_token.cache_clear()
+        t0 = time.perf_counter()
+        parsed = sum(1 for t in corpus if fn(t) is not None)
+        dt = time.perf_counter() - t0
+        print(f"dates {name:<15} rows={rows} parsed={parsed} {dt / rows * 1e6:8.1f} us/row")
+    print(main._parse_date_token.cache_info())
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("extract", help="per-row inner_text vs single page.evaluate")
+    ex.add_argument("--rows", type=int, default=200)
+    ex.add_argument("--repeat", type=int, default=20)
+    ex.add_argument("--chromium", default=os.getenv("CHROMIUM_EXECUTABLE", ""), help="path to a Chromium binary")
+    en = sub.add_parser("engines", help="browser vs direct-HTTP engine against a local fixture server")
+    en.add_argument("--queries", type=int, default=50)
+    en.add_argument("--rows", type=int, default=200)
+    bl = sub.add_parser("blocking", help="navigation time / heap with and without resource blocking")
+    bl.add_argument("--images", type=int, default=40)
+    bl.add_argument("--repeat", type=int, default=5)
+    xl = sub.add_parser("xlsx", help="peak memory of the output workbook writer")
+    xl.add_argument("--sizes", default="1000,10000,100000")
+    ing = sub.add_parser("ingest", help="spreadsheet parse time / peak memory")
+    ing.add_argument("--rows", type=int, default=50000)
+    da = sub.add_parser("dates", help="compiled+memoized date parser vs fuzzy dateutil")
+    da.add_argument("--rows", type=int, default=20000)
+    args = ap.parse_args()
+
+    if args.cmd == "extract":
+        asyncio.run(bench_extract(args.rows, args.repeat, args.chromium))
+    elif args.cmd == "engines":
+        asyncio.run(bench_engines(args.queries, args.rows))
+    elif args.cmd == "blocking":
+        asyncio.run(bench_blocking(args.images, args.repeat))
+    elif args.cmd == "xlsx":
+        bench_xlsx([int(x) for x in args.sizes.split(",")])
+    elif args.cmd == "ingest":
+        bench_ingest(args.rows)
+    elif args.cmd == "dates":
+        bench_dates(args.rows)
+
+
+if __name__ == "__main__":
+    cli()
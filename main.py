@@ -1,32 +1,933 @@
 from __future__ import annotations
 
+import os
 import re
+import json
+import time
+import sqlite3
 import asyncio
+import hashlib
+import importlib.util
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
 from io import BytesIO
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Tuple
+from functools import lru_cache, partial
+from typing import Callable, Optional, List, Tuple
+from urllib.parse import urljoin
 
+import httpx
+import numpy as np
 import pandas as pd
 from dateutil import parser as dateparser
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from openpyxl import Workbook, load_workbook
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
 
 APP_TITLE = "Card Pricing Agent"
 SOURCE_NAME = "130point (eBay sold search)"
 SALES_URL = "https://130point.com/sales/?q={query}"
 
+# Browser pool limits (shared by all uploads in this process)
+MAX_BROWSERS = int(os.getenv("MAX_BROWSERS", "1"))
+MAX_PAGES = int(os.getenv("MAX_PAGES", "4"))
+
+# Concurrent pages per upload, and the process-wide politeness budget for 130point
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "3"))
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "1.5"))  # requests / second
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "2"))
+
+# Adaptive (AIMD) pacing bounds for the upstream rate
+PACER_MIN_RATE = float(os.getenv("PACER_MIN_RATE", "0.2"))
+PACER_MAX_RATE = float(os.getenv("PACER_MAX_RATE", "4"))
+PACER_INCREASE = float(os.getenv("PACER_INCREASE", "0.05"))  # req/s added per clean response
+PACER_BACKOFF = float(os.getenv("PACER_BACKOFF", "0.5"))  # rate multiplier on block/timeout
+PACER_COOLDOWN = float(os.getenv("PACER_COOLDOWN", "30"))  # seconds with no new requests
+PACER_SLOW_SECONDS = float(os.getenv("PACER_SLOW_SECONDS", "8"))  # slower responses don't speed up
+
+# Circuit breaker: open after N consecutive blocks, requeue blocked queries (bounded)
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "3"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "60"))
+BREAKER_MAX_OPEN_SECONDS = float(os.getenv("BREAKER_MAX_OPEN_SECONDS", "600"))
+BREAKER_MAX_REQUEUES = int(os.getenv("BREAKER_MAX_REQUEUES", "3"))
+
+# Per-query result cache (in-memory LRU + SQLite tier that survives restarts)
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(36 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "price_cache.sqlite3")
+# Negative cache for empty / unparseable / blocked outcomes (in-memory, short TTLs)
+NEG_TTL_EMPTY = int(os.getenv("NEG_TTL_EMPTY", str(6 * 3600)))
+NEG_TTL_UNPARSEABLE = int(os.getenv("NEG_TTL_UNPARSEABLE", "3600"))
+NEG_TTL_BLOCKED = int(os.getenv("NEG_TTL_BLOCKED", "300"))
+NEG_MAX_ENTRIES = int(os.getenv("NEG_MAX_ENTRIES", "20000"))
+NEG_BLOOM_BITS = int(os.getenv("NEG_BLOOM_BITS", str(1 << 18)))  # 32 KiB per generation
+# Stale-while-revalidate: how long past the TTL an entry may still be served (and is kept)
+STALE_MAX_SECONDS = int(os.getenv("STALE_MAX_SECONDS", str(7 * 24 * 3600)))
+
+# Every parsed sold comp, kept for incremental refresh and windowed stats
+COMPS_DB_PATH = os.getenv("COMPS_DB_PATH", "comps.sqlite3")
+
+# Look-back windows (days) for the per-row stats columns, and the trimmed-mean cut per side
+PRICE_WINDOWS = [int(w) for w in os.getenv("PRICE_WINDOWS", "7,30,90,180,365").split(",") if w.strip()]
+TRIM_FRACTION = float(os.getenv("TRIM_FRACTION", "0.1"))
+
+# Outlier rejection for the robust price: "iqr" (Tukey fences) or "mad"
+OUTLIER_METHOD = os.getenv("OUTLIER_METHOD", "iqr")
+OUTLIER_K = float(os.getenv("OUTLIER_K", "3.0" if OUTLIER_METHOD == "mad" else "1.5"))
+
+# Background jobs (POST /jobs): state in SQLite, uploaded/priced workbooks on disk
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+MAX_RUNNING_JOBS = int(os.getenv("MAX_RUNNING_JOBS", "2"))
+# Finished jobs (row + files) are deleted once older than this; checked every JOB_PURGE_INTERVAL s
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "72"))
+JOB_PURGE_INTERVAL = float(os.getenv("JOB_PURGE_INTERVAL", "3600"))
+
+# Excel ingestion backend: "auto" uses python-calamine when installed, else openpyxl read-only
+XLSX_READER = os.getenv("XLSX_READER", "auto")
+
+# "evaluate" pulls all row texts/cells in one page.evaluate round trip; "per_row" is the
+# original one-inner_text-per-row path (also used as the fallback)
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "evaluate")
+MAX_PARSE_ROWS = 200
+
+# Results are newest first: extraction stops after STOP_AFTER_OLD_ROWS consecutive rows older
+# than COMP_WINDOW_DAYS (or than the latest stored sale), or once TARGET_COMPS new comps are
+# parsed (0 = no target). Rows are pulled ROW_CHUNK at a time; if a page runs out first, up to
+# MAX_RESULT_PAGES pages are read via "load more" / next-page controls.
+COMP_WINDOW_DAYS = int(os.getenv("COMP_WINDOW_DAYS", str(max([90] + PRICE_WINDOWS))))
+STOP_AFTER_OLD_ROWS = int(os.getenv("STOP_AFTER_OLD_ROWS", "3"))
+TARGET_COMPS = int(os.getenv("TARGET_COMPS", "0"))
+ROW_CHUNK = int(os.getenv("ROW_CHUNK", "50"))
+MAX_RESULT_PAGES = int(os.getenv("MAX_RESULT_PAGES", "3"))
+PAGE_TIMEOUT_MS = int(os.getenv("PAGE_TIMEOUT_MS", "10000"))
+
+# "browser" = Playwright only; "http" = direct fetch + HTML parse, falling back to the browser
+# when the response is empty, blocked or needs JS. Overridable per request.
+# "capture" = browser, but read the page's own backend data response instead of the DOM.
+SCRAPE_ENGINE = os.getenv("SCRAPE_ENGINE", "browser")
+ENGINES = ("browser", "http", "capture")
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "8"))
+
+# XHR/fetch responses whose URL matches this are treated as the sales data payload
+CAPTURE_URL_PATTERN = os.getenv("CAPTURE_URL_PATTERN", r"130point\.com/.*(?:api|ajax|search|backend)")
+CAPTURE_TIMEOUT_MS = int(os.getenv("CAPTURE_TIMEOUT_MS", "15000"))
+
+# Request routing on scraping contexts: abort resource types / domains we never need for prices
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "1") == "1"
+BLOCKED_RESOURCE_TYPES = set(
+    t.strip() for t in os.getenv("BLOCKED_RESOURCE_TYPES", "image,media,font").split(",") if t.strip()
+)
+BLOCKED_DOMAINS = set(
+    d.strip().lower()
+    for d in os.getenv(
+        "BLOCKED_DOMAINS",
+        "google-analytics.com,googletagmanager.com,doubleclick.net,googlesyndication.com,"
+        "adservice.google.com,amazon-adsystem.com,facebook.net,hotjar.com,"
+        "scorecardresearch.com,quantserve.com,adnxs.com,taboola.com,outbrain.com",
+    ).split(",")
+    if d.strip()
+)
+
+# Threads for blocking pandas/openpyxl/dateutil work, and the loop-lag probe period
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "4"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/123.0.0.0 Safari/537.36"
+)
+
 
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
 
-app = FastAPI(title=APP_TITLE, version="1.0.2")
+def window_start(days: int) -> datetime:
+    """
+    UTC midnight `days` days ago. Every N-day figure cuts here, so a window holds exactly
+    the sales whose epoch day is at most N days before today, as window_stats counts them.
+    """
+    return datetime.fromtimestamp((int(time.time() // 86400) - days) * 86400, tz=timezone.utc)
+
+
+class TokenBucket:
+    """
+    Async token bucket. One instance is shared by every upload/page so the total
+    request rate to 130point stays bounded no matter how many workers are active.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(rate, 0.01)
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self._updated is None:
+            self._updated = now
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                self._refill(loop.time())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptivePacer(TokenBucket):
+    """
+    AIMD pacing on top of the token bucket: every clean, fast response adds
+    `increase` req/s (up to max_rate); a block or timeout multiplies the rate by
+    `backoff` (down to min_rate) and pauses all acquires for `cooldown` seconds.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        min_rate: float = PACER_MIN_RATE,
+        max_rate: float = PACER_MAX_RATE,
+        increase: float = PACER_INCREASE,
+        backoff: float = PACER_BACKOFF,
+        cooldown: float = PACER_COOLDOWN,
+        slow_seconds: float = PACER_SLOW_SECONDS,
+        window: int = 50,
+    ):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+        self.increase = increase
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.slow_seconds = slow_seconds
+        self._outcomes: deque = deque(maxlen=window)
+        self._cooldown_until = 0.0
+        self.backoffs = 0
+
+    async def acquire(self):
+        while time.monotonic() < self._cooldown_until:
+            await asyncio.sleep(self._cooldown_until - time.monotonic())
+        await super().acquire()
+
+    def record(self, blocked: bool = False, timed_out: bool = False, latency: float = 0.0):
+        bad = blocked or timed_out
+        self._outcomes.append(bad)
+        if bad:
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            self._tokens = min(self._tokens, 0.0)
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + self.cooldown)
+            self.backoffs += 1
+        elif latency <= self.slow_seconds:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def stats(self) -> dict:
+        remaining = max(0.0, self._cooldown_until - time.monotonic())
+        n = len(self._outcomes)
+        return {
+            "rate_per_sec": round(self.rate, 3),
+            "min_rate": self.min_rate,
+            "max_rate": self.max_rate,
+            "block_ratio": round(sum(self._outcomes) / n, 3) if n else 0.0,
+            "recent_requests": n,
+            "backing_off": remaining > 0,
+            "cooldown_remaining_sec": round(remaining, 1),
+            "backoffs": self.backoffs,
+        }
+
+
+# Note prefixes emitted only where the upstream request itself timed out (a
+# PlaywrightTimeoutError on goto, an httpx.TimeoutException); readiness diagnostics,
+# page titles and snippets never start with these
+TIMEOUT_NOTES = ("Navigation timeout:", "HTTP timeout:")
+
+
+def classify_outcome(notes: str) -> Tuple[bool, bool]:
+    """(blocked, timed_out) for a scrape's notes / fallback reason."""
+    n = notes or ""
+    blocked = n.startswith("Blocked") or n in ("HTTP 403", "HTTP 429")
+    return blocked, n.startswith(TIMEOUT_NOTES)
+
+
+upstream_limiter = AdaptivePacer(UPSTREAM_RATE, UPSTREAM_BURST)
+
+
+class CircuitBreaker:
+    """
+    Process-wide breaker for 130point blocks. `threshold` consecutive blocks open it;
+    while open, workers wait instead of scraping. After the open period one worker at a
+    time probes (half-open); a clean probe closes it, another block re-opens it for
+    twice as long (capped at max_open_seconds). before_request() returns a probe token
+    (0 if the caller is not the probe) to pass to record(), and to release() in a finally
+    so a cancelled probe frees the slot for another worker.
+    """
+
+    def __init__(
+        self,
+        threshold: int = BREAKER_THRESHOLD,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        max_open_seconds: float = BREAKER_MAX_OPEN_SECONDS,
+    ):
+        self.threshold = max(1, threshold)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = "closed"
+        self.consecutive_blocks = 0
+        self.opens = 0
+        self._open_for = open_seconds
+        self._open_until = 0.0
+        self._probe = 0  # token of the probe in flight, 0 if none
+        self._probes = 0
+
+    async def before_request(self) -> int:
+        while True:
+            if self.state == "closed":
+                return 0
+            now = time.monotonic()
+            if self.state == "open" and now >= self._open_until:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe:
+                self._probes += 1
+                self._probe = self._probes
+                return self._probe
+            await asyncio.sleep(max(0.25, self._open_until - now) if self.state == "open" else 0.25)
+
+    def release(self, probe: int):
+        # The probe ended without a result (cancelled, error): let another worker probe
+        if probe and probe == self._probe:
+            self._probe = 0
+
+    def record(self, blocked: bool, probe: int = 0):
+        # Only the probe's own result may close the breaker; requests that started
+        # before it opened must not
+        was_probe = bool(probe) and probe == self._probe
+        if was_probe:
+            self._probe = 0
+        if not blocked:
+            self.consecutive_blocks = 0
+            if was_probe:
+                self.state = "closed"
+                self._open_for = self.open_seconds
+            return
+        self.consecutive_blocks += 1
+        if was_probe or (self.state == "closed" and self.consecutive_blocks >= self.threshold):
+            if was_probe:
+                self._open_for = min(self.max_open_seconds, self._open_for * 2)
+            self.state = "open"
+            self._open_until = time.monotonic() + self._open_for
+            self.opens += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_blocks": self.consecutive_blocks,
+            "opens": self.opens,
+            "open_remaining_sec": round(max(0.0, self._open_until - time.monotonic()), 1)
+            if self.state == "open" else 0.0,
+        }
+
+
+upstream_breaker = CircuitBreaker()
+
+# Bounded pool for CPU-bound / blocking work (sheet parsing, row parsing, workbook writing).
+# Created per app lifespan; outside one (scripts, bench.py) the loop's default executor is used.
+cpu_executor: Optional[ThreadPoolExecutor] = None
+
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, partial(fn, *args))
+
+
+class LoopLagMonitor:
+    """
+    Sleeps `interval` seconds in a loop and records how late each wake-up is. Sustained
+    lag means something is blocking the event loop.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.avg_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, (loop.time() - t0 - self.interval) * 1000)
+            self.last_ms = lag
+            self.max_ms = max(self.max_ms, lag)
+            self.avg_ms = 0.9 * self.avg_ms + 0.1 * lag
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "last_ms": round(self.last_ms, 2),
+            "avg_ms": round(self.avg_ms, 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+loop_lag = LoopLagMonitor()
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", (query or "").strip()).lower()
+
+
+class ResultCache:
+    """
+    TTL cache of scrape results keyed by normalized query. Hot entries live in a
+    size-bounded LRU; every entry is also written to SQLite so restarts keep it.
+    Expired entries are retained for another `stale_retention` seconds so they can
+    still be served in stale-while-revalidate mode.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_DB_PATH,
+        ttl: int = CACHE_TTL_SECONDS,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        stale_retention: int = STALE_MAX_SECONDS,
+    ):
+        self.ttl = ttl
+        self.stale_retention = stale_retention
+        self.max_entries = max(1, max_entries)
+        self._mem: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "query TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def lookup(self, query: str) -> Optional[Tuple[tuple, float]]:
+        """(value, age_seconds) for fresh or retained-stale entries, else None."""
+        key = normalize_query(query)
+        now = time.time()
+        keep_for = self.ttl + self.stale_retention
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                stored_at, value = hit
+                if now - stored_at <= keep_for:
+                    self._mem.move_to_end(key)
+                    return value, now - stored_at
+                del self._mem[key]
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, stored_at FROM results WHERE query = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > keep_for:
+                self._db.execute("DELETE FROM results WHERE query = ?", (key,))
+                self._db.commit()
+                return None
+            value = tuple(json.loads(row[0]))
+            self._remember(key, row[1], value)
+            return value, now - row[1]
+
+    def set(self, query: str, value: tuple):
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, tuple(value))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (query, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(list(value)), now),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, stored_at: float, value: tuple):
+        self._mem[key] = (stored_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl - self.stale_retention
+        with self._lock:
+            for k in [k for k, (ts, _) in self._mem.items() if ts < cutoff]:
+                del self._mem[k]
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE stored_at < ?", (cutoff,))
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        return {"memory_entries": len(self._mem), "ttl_seconds": self.ttl, "max_entries": self.max_entries}
+
+
+# Opened in lifespan so importing this module creates no files
+result_cache: Optional[ResultCache] = None
+
+
+class BloomFilter:
+    """Fixed-size bit array with k hash probes (double hashing over one blake2b digest)."""
+
+    def __init__(self, bits: int = NEG_BLOOM_BITS, hashes: int = 4):
+        self.bits = max(8, bits)
+        self.hashes = hashes
+        self._arr = bytearray((self.bits + 7) // 8)
+
+    def _probes(self, key: str):
+        d = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key: str):
+        for b in self._probes(key):
+            self._arr[b >> 3] |= 1 << (b & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._arr[b >> 3] & (1 << (b & 7)) for b in self._probes(key))
+
+
+class NegativeCache:
+    """
+    Short-lived cache of queries that produced no usable price, kept apart from the
+    positive ResultCache. Each outcome kind has its own TTL. Two rotating Bloom filter
+    generations answer "definitely not negative" in O(1) without touching the map; the
+    size-bounded map holds the notes to return and the exact expiry.
+    """
+
+    TTLS = {"empty": NEG_TTL_EMPTY, "unparseable": NEG_TTL_UNPARSEABLE, "blocked": NEG_TTL_BLOCKED}
+
+    def __init__(self, max_entries: int = NEG_MAX_ENTRIES, bloom_bits: int = NEG_BLOOM_BITS):
+        self.max_entries = max(1, max_entries)
+        self._bloom_bits = bloom_bits
+        self._current = BloomFilter(bloom_bits)
+        self._previous = BloomFilter(bloom_bits)
+        self._rotate_every = max(self.TTLS.values())
+        self._rotated_at = time.time()
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.filtered = 0
+
+    @staticmethod
+    def kind(res: tuple) -> Optional[str]:
+        notes = res[2] or ""
+        if res[0] is not None:
+            return None
+        # A missing table only means "no results" when the page said so; readiness
+        # timeouts and errors are transient and not cached
+        if notes.startswith("No results table found") and NO_RESULTS_NOTE in notes:
+            return "empty"
+        if notes.startswith("Found table rows"):
+            return "unparseable"
+        if notes.startswith("Blocked"):
+            return "blocked"
+        return None
+
+    def _maybe_rotate(self, now: float):
+        # entries live at most _rotate_every, so two generations always cover them
+        if now - self._rotated_at >= self._rotate_every:
+            self._previous, self._current = self._current, BloomFilter(self._bloom_bits)
+            self._rotated_at = now
+
+    def get(self, query: str) -> Optional[tuple]:
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._maybe_rotate(now)
+            if key not in self._current and key not in self._previous:
+                self.filtered += 1
+                return None
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            expires_at, value = hit
+            if now > expires_at:
+                del self._entries[key]
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, query: str, res: tuple) -> bool:
+        kind = self.kind(res)
+        if kind is None:
+            return False
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._maybe_rotate(now)
+            self._current.add(key)
+            self._entries[key] = (now + self.TTLS[kind], tuple(res))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def discard(self, query: str):
+        with self._lock:
+            self._entries.pop(normalize_query(query), None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "bloom_filtered": self.filtered,
+            "bloom_bytes": 2 * len(self._current._arr),
+        }
+
+
+negative_cache = NegativeCache()
+
+
+class ResourceBlocker:
+    """
+    context.route handler that aborts BLOCKED_RESOURCE_TYPES and BLOCKED_DOMAINS.
+    Keeps process-wide counters of blocked requests and of the bytes still loaded.
+    """
+
+    def __init__(self):
+        self.blocked_requests = 0
+        self.blocked_by_type: dict = {}
+        self.blocked_by_domain: dict = {}
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+
+    @staticmethod
+    def _denied_domain(url: str) -> Optional[str]:
+        host = (httpx.URL(url).host or "").lower()
+        for d in BLOCKED_DOMAINS:
+            if host == d or host.endswith("." + d):
+                return d
+        return None
+
+    async def handle(self, route):
+        req = route.request
+        domain = self._denied_domain(req.url)
+        if req.resource_type in BLOCKED_RESOURCE_TYPES or domain:
+            self.blocked_requests += 1
+            key = domain or req.resource_type
+            counter = self.blocked_by_domain if domain else self.blocked_by_type
+            counter[key] = counter.get(key, 0) + 1
+            await route.abort("blockedbyclient")
+            return
+        self.allowed_requests += 1
+        await route.continue_()
+
+    def on_response(self, resp):
+        try:
+            self.allowed_bytes += int(resp.headers.get("content-length") or 0)
+        except ValueError:
+            pass
+
+    async def attach(self, context):
+        await context.route("**/*", self.handle)
+        context.on("response", self.on_response)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": BLOCK_RESOURCES,
+            "blocked_requests": self.blocked_requests,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "blocked_by_domain": dict(self.blocked_by_domain),
+            "allowed_requests": self.allowed_requests,
+            "allowed_bytes": self.allowed_bytes,
+        }
+
+
+resource_blocker = ResourceBlocker()
+
+
+class CompStore:
+    """
+    Every parsed sold comp (query, sale time, price, title) in SQLite, indexed by query
+    and date. Re-pricing only has to add sales newer than the latest stored one.
+    """
+
+    def __init__(self, path: str = COMPS_DB_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        # A sale is identified by its epoch day, price and canonical title (comp_title_key),
+        # so every engine's rendering of it maps to the same row; `seq` numbers identical
+        # sales within one scrape, so separate same-day sales at one price are all kept
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS comps ("
+            "query TEXT NOT NULL, sale_day INTEGER NOT NULL, sale_ts REAL NOT NULL, price REAL NOT NULL, "
+            "title TEXT NOT NULL DEFAULT '', title_key TEXT NOT NULL DEFAULT '', "
+            "seq INTEGER NOT NULL DEFAULT 0, fetched_at REAL NOT NULL, "
+            "UNIQUE (query, sale_day, price, title_key, seq))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_comps_query_date ON comps (query, sale_ts)")
+        self._db.commit()
+
+    def add(self, query: str, records) -> int:
+        key = normalize_query(query)
+        now = time.time()
+        seen: dict = {}
+        rows = []
+        for d, p, t in records:
+            if d is None or p is None:
+                continue
+            ident = (int(d.timestamp() // 86400), round(p, 2), comp_title_key(t))
+            seen[ident] = seen.get(ident, -1) + 1
+            rows.append((key, ident[0], d.timestamp(), ident[1], t or "", ident[2], seen[ident], now))
+        if not rows:
+            return 0
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO comps "
+                "(query, sale_day, sale_ts, price, title, title_key, seq, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def latest(self, query: str) -> Optional[datetime]:
+        """Start (UTC midnight) of the newest stored sale day, so a re-scrape re-reads that whole day."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(sale_day) FROM comps WHERE query = ?", (normalize_query(query),)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return datetime.fromtimestamp(row[0] * 86400, tz=timezone.utc)
+
+    def arrays(self, query: str, since: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(sale epoch-day int64, price float64) for the query, newest first."""
+        sql = "SELECT sale_day, price FROM comps WHERE query = ?"
+        args: list = [normalize_query(query)]
+        if since is not None:
+            sql += " AND sale_ts >= ?"
+            args.append(since.timestamp())
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY sale_ts DESC", args).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        days, prices = zip(*rows)
+        return np.asarray(days, dtype=np.int64), np.asarray(prices, dtype=np.float64)
+
+    def graded_arrays(
+        self, query: str, grade: Tuple[str, str], since: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Like arrays(), restricted to comps whose title grades as `grade`, e.g. ("PSA", "10")."""
+        sql = "SELECT sale_day, price, title FROM comps WHERE query = ?"
+        args: list = [normalize_query(query)]
+        if since is not None:
+            sql += " AND sale_ts >= ?"
+            args.append(since.timestamp())
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY sale_ts DESC", args).fetchall()
+        rows = [(d, p) for d, p, t in rows if title_grade(t) == grade]
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        days, prices = zip(*rows)
+        return np.asarray(days, dtype=np.int64), np.asarray(prices, dtype=np.float64)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, q = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT query) FROM comps").fetchone()
+        return {"comps": n, "queries": q}
+
+
+comp_store: Optional[CompStore] = None
+
+
+class BrowserPool:
+    """
+    App-wide Chromium pool. Browsers are launched lazily (up to max_browsers) and
+    each lease gets its own isolated context + page. Total open pages are capped
+    by max_pages across all concurrent uploads.
+    """
+
+    def __init__(self, max_browsers: int = MAX_BROWSERS, max_pages: int = MAX_PAGES):
+        self.max_browsers = max(1, max_browsers)
+        self.max_pages = max(1, max_pages)
+        self._pw = None
+        self._browsers: list = []
+        self._leases: dict = {}
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(self.max_pages)
+
+    async def start(self):
+        if self._pw is None:
+            self._pw = await async_playwright().start()
+
+    async def stop(self):
+        async with self._lock:
+            for b in self._browsers:
+                try:
+                    await b.close()
+                except Exception:
+                    pass
+            self._browsers.clear()
+            self._leases.clear()
+            if self._pw is not None:
+                await self._pw.stop()
+                self._pw = None
+
+    async def _pick_browser(self):
+        async with self._lock:
+            if self._pw is None:
+                raise RuntimeError("Browser pool is not started.")
+            # drop browsers that crashed / disconnected
+            self._browsers = [b for b in self._browsers if b.is_connected()]
+            if len(self._browsers) < self.max_browsers:
+                b = await self._pw.chromium.launch(headless=True)
+                self._browsers.append(b)
+                self._leases[b] = 0
+            # least-loaded browser
+            b = min(self._browsers, key=lambda x: self._leases.get(x, 0))
+            self._leases[b] = self._leases.get(b, 0) + 1
+            return b
+
+    def _release_browser(self, browser):
+        if browser in self._leases:
+            self._leases[browser] = max(0, self._leases[browser] - 1)
+
+    @asynccontextmanager
+    async def page(self):
+        async with self._slots:
+            browser = await self._pick_browser()
+            context = None
+            try:
+                context = await browser.new_context(
+                    user_agent=USER_AGENT,
+                    locale="en-US",
+                    viewport={"width": 1280, "height": 800},
+                )
+                if BLOCK_RESOURCES:
+                    await resource_blocker.attach(context)
+                yield await context.new_page()
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                self._release_browser(browser)
+
+    def stats(self) -> dict:
+        return {
+            "browsers": len(self._browsers),
+            "max_browsers": self.max_browsers,
+            "max_pages": self.max_pages,
+            "pages_in_use": sum(self._leases.values()),
+        }
+
+
+browser_pool = BrowserPool()
+
+# Pooled keep-alive client for the direct-HTTP engine (created in lifespan)
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def new_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT, "Accept-Language": "en-US,en;q=0.9"},
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        ),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client, job_store, result_cache, comp_store, cpu_executor
+    cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+    loop_lag.start()
+    result_cache = ResultCache()
+    result_cache.purge_expired()
+    comp_store = CompStore()
+    await browser_pool.start()
+    http_client = new_http_client()
+    job_store = JobStore()
+    purger = asyncio.create_task(purge_jobs_periodically())
+    # Resume jobs that were queued/running when the process last stopped
+    for job_id in job_store.unfinished():
+        start_job(job_id)
+    try:
+        yield
+    finally:
+        tasks = [purger] + list(_job_tasks.values()) + list(_refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        job_store.close()
+        await http_client.aclose()
+        http_client = None
+        await browser_pool.stop()
+        result_cache.close()
+        comp_store.close()
+        await loop_lag.stop()
+        cpu_executor.shutdown(wait=False)
+        cpu_executor = None
+
+
+app = FastAPI(title=APP_TITLE, version="1.0.2", lifespan=lifespan)
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "browser_pool": browser_pool.stats(), "cache": result_cache.stats()}
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "browser_pool": browser_pool.stats(),
+        "cache": result_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "comp_store": comp_store.stats(),
+        "resource_blocking": resource_blocker.stats(),
+        "event_loop_lag": loop_lag.stats(),
+        "upstream_pacer": upstream_limiter.stats(),
+        "upstream_breaker": upstream_breaker.stats(),
+        "singleflight": {**singleflight_stats, "in_flight": len(_inflight)},
+        "row_scan": dict(scan_stats),
+    }
 
 
 def clean_grade(val) -> Optional[str]:
@@ -63,7 +964,68 @@ def parse_price(text: str) -> Optional[float]:
         return None
 
 
+_MONTH_RE = (
+    r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+)
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+
+# Date formats 130point rows actually show; first match in the row text wins
+DATE_TOKEN_RE = re.compile(
+    r"(?P<iso>\b\d{4}-\d{1,2}-\d{1,2}(?:[T ]\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?(?:\s*(?:Z|[+-]\d{2}:?\d{2}))?)?)"
+    r"|(?P<us>\b\d{1,2}/\d{1,2}/\d{2,4}\b)"
+    rf"|(?P<mdy>\b{_MONTH_RE}\.?\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}\b)"
+    rf"|(?P<dmy>\b\d{{1,2}}\s+{_MONTH_RE}\.?,?\s+\d{{4}}\b)",
+    re.I,
+)
+
+# Parts of an (already lowercased) iso token; the UTC offset, when present, is applied
+ISO_PARTS_RE = re.compile(
+    r"(\d{4})-(\d{1,2})-(\d{1,2})(?:[t ](\d{1,2}):(\d{2})(?::(\d{2}))?(?:\.\d+)?(?:\s*(?:z|([+-])(\d{2}):?(\d{2})))?)?"
+)
+
+DATE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date_token(kind: str, token: str) -> Optional[datetime]:
+    nums = [int(n) for n in re.findall(r"\d+", token)]
+    try:
+        if kind == "iso":
+            y, mo, d, hh, mi, ss, sign, oh, om = ISO_PARTS_RE.match(token).groups()
+            dt = datetime(int(y), int(mo), int(d), int(hh or 0), int(mi or 0), int(ss or 0), tzinfo=timezone.utc)
+            if sign:
+                offset = timedelta(hours=int(oh), minutes=int(om))
+                dt = dt - offset if sign == "+" else dt + offset
+            return dt
+        if kind == "us":
+            mo, d, y = nums
+            return datetime(y + 2000 if y < 100 else y, mo, d, tzinfo=timezone.utc)
+        # mdy / dmy: the only numbers are day and year either way
+        mo = _MONTHS[re.search(r"[a-z]{3}", token).group(0)]
+        d, y = nums
+        return datetime(y, mo, d, tzinfo=timezone.utc)
+    except (ValueError, KeyError, AttributeError):
+        return None
+
+
 def parse_date(text: str) -> Optional[datetime]:
+    """
+    Compiled patterns for the formats 130point emits, memoized per date token; fuzzy
+    dateutil parsing of the whole text is only the last resort.
+    """
+    m = DATE_TOKEN_RE.search(text or "")
+    if m:
+        token = re.sub(r"\s+", " ", m.group(0).lower())
+        dt = _parse_date_token(m.lastgroup, token)
+        if dt is not None:
+            return dt
+    return parse_date_fuzzy(text)
+
+
+def parse_date_fuzzy(text: str) -> Optional[datetime]:
     try:
         dt = dateparser.parse(text, fuzzy=True)
         if dt is None:
@@ -75,48 +1037,643 @@ def parse_date(text: str) -> Optional[datetime]:
         return None
 
 
-def avg_90d(sales: List[Tuple[Optional[datetime], Optional[float]]]):
-    cutoff = now_utc() - timedelta(days=90)
-    prices = [p for d, p in sales if d is not None and d >= cutoff and p is not None]
-    if not prices:
+def window_stats(days: np.ndarray, prices: np.ndarray, windows: List[int], today: Optional[int] = None) -> dict:
+    """
+    Stats for every window from one pass over comps sorted newest first: each window is
+    a prefix of the array, so count/mean/min/max come from cumulative arrays and only
+    median / trimmed mean sort a prefix. Returns {window: {stat: value}}.
+    """
+    if today is None:
+        today = int(time.time() // 86400)
+    ages = today - days
+    order = np.argsort(ages, kind="stable")
+    ages, prices = ages[order], prices[order]
+    ends = np.searchsorted(ages, np.asarray(windows), side="right")
+    csum = np.cumsum(prices)
+    cmin = np.minimum.accumulate(prices) if len(prices) else prices
+    cmax = np.maximum.accumulate(prices) if len(prices) else prices
+
+    out = {}
+    for w, k in zip(windows, ends.tolist()):
+        if k == 0:
+            out[w] = {"count": 0, "mean": None, "median": None, "min": None, "max": None, "trimmed_mean": None}
+            continue
+        window = np.sort(prices[:k])
+        cut = int(k * TRIM_FRACTION)
+        out[w] = {
+            "count": k,
+            "mean": round(float(csum[k - 1] / k), 2),
+            "median": round(float(np.median(window)), 2),
+            "min": round(float(cmin[k - 1]), 2),
+            "max": round(float(cmax[k - 1]), 2),
+            "trimmed_mean": round(float(window[cut:k - cut].mean()), 2),
+        }
+    return out
+
+
+GRADE_TITLE_RE = re.compile(
+    r"\b(PSA|BGS|BVG|SGC|CGC|CSG|HGA)\s*(?:gem\s*(?:mint|mt)\s*|mint\s*)?(\d{1,2}(?:\.5)?)\b", re.I
+)
+
+
+@lru_cache(maxsize=8192)
+def title_grade(title: str) -> Optional[Tuple[str, str]]:
+    """(grader, grade) parsed from a sold listing title, e.g. ("PSA", "10"); None if raw."""
+    m = GRADE_TITLE_RE.search(title or "")
+    return (m.group(1).upper(), m.group(2)) if m else None
+
+
+def comp_arrays(query: str, grade: Optional[str], since: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    # grade is set only in grade fan-out mode: the query is the ungraded base query
+    if grade is None:
+        return comp_store.arrays(query, since)
+    return comp_store.graded_arrays(query, ("PSA", grade), since)
+
+
+def query_window_stats(query: str, windows: List[int], grade: Optional[str] = None) -> dict:
+    since = window_start(max(windows))
+    days, prices = comp_arrays(query, grade, since)
+    return window_stats(days, prices, windows)
+
+
+def window_columns(w: int) -> dict:
+    return {
+        "count": f"# Comps ({w}d)",
+        "mean": f"Mean ({w}d, USD)",
+        "median": f"Median ({w}d, USD)",
+        "min": f"Min ({w}d, USD)",
+        "max": f"Max ({w}d, USD)",
+        "trimmed_mean": f"Trimmed Mean ({w}d, USD)",
+    }
+
+
+def parse_windows(windows: Optional[str]) -> List[int]:
+    if not windows:
+        return list(PRICE_WINDOWS)
+    try:
+        out = sorted({int(w) for w in windows.split(",") if w.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="windows must be comma-separated day counts, e.g. 7,30,90.")
+    if not out or out[0] <= 0:
+        raise HTTPException(status_code=400, detail="windows must be positive day counts.")
+    return out
+
+
+def avg_90d(prices: np.ndarray):
+    # `prices`: float64 array of comps already restricted to the last 90 days
+    if not len(prices):
         return None, 0, "No sold comps with dates in last 90 days."
-    return round(sum(prices) / len(prices), 2), len(prices), ""
+    return round(float(prices.mean()), 2), int(len(prices)), ""
+
+
+def _segment_quantile(p: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    # p is sorted within each segment; linear interpolation like np.quantile
+    out = np.full(len(counts), np.nan)
+    has = counts > 0
+    pos = starts[has] + q * (counts[has] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    out[has] = p[lo] + (p[hi] - p[lo]) * (pos - lo)
+    return out
+
+
+def robust_stats_batch(
+    prices: np.ndarray,
+    segments: np.ndarray,
+    n_segments: int,
+    method: str = OUTLIER_METHOD,
+    k: float = OUTLIER_K,
+) -> dict:
+    """
+    Robust per-segment stats for many comp sets at once (segment i = one query's comps).
+    Outliers are rejected by IQR fences (q1 - k*IQR, q3 + k*IQR) or by MAD
+    (|p - median| > k * 1.4826 * MAD). Returns arrays of length n_segments:
+    count, median, robust_mean (mean of inliers), trimmed_mean, outliers.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    segments = np.asarray(segments, dtype=np.int64)
+    order = np.lexsort((prices, segments))
+    p, s = prices[order], segments[order]
+    counts = np.bincount(s, minlength=n_segments)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+
+    median = _segment_quantile(p, starts, counts, 0.5)
+    if method == "mad":
+        dev = np.abs(p - median[s])
+        dev_sorted = dev[np.lexsort((dev, s))]
+        spread = k * 1.4826 * _segment_quantile(dev_sorted, starts, counts, 0.5)
+        lower, upper = median - spread, median + spread
+    else:
+        q1 = _segment_quantile(p, starts, counts, 0.25)
+        q3 = _segment_quantile(p, starts, counts, 0.75)
+        lower, upper = q1 - k * (q3 - q1), q3 + k * (q3 - q1)
+    inlier = (p >= lower[s]) & (p <= upper[s])
+    kept = np.bincount(s, weights=inlier, minlength=n_segments)
+
+    rank = np.arange(len(p)) - starts[s]
+    cut = np.floor(counts * TRIM_FRACTION).astype(np.int64)
+    in_trim = (rank >= cut[s]) & (rank < (counts - cut)[s])
+    trimmed_n = np.bincount(s, weights=in_trim, minlength=n_segments)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        robust_mean = np.bincount(s, weights=p * inlier, minlength=n_segments) / kept
+        trimmed_mean = np.bincount(s, weights=p * in_trim, minlength=n_segments) / trimmed_n
+    return {
+        "count": counts,
+        "median": median,
+        "robust_mean": robust_mean,
+        "trimmed_mean": trimmed_mean,
+        "outliers": counts - kept.astype(np.int64),
+    }
+
+
+def robust_stats_for_queries(queries: List[str], days: int = 90, grades: Optional[List[Optional[str]]] = None) -> dict:
+    """
+    {(normalized_query, grade): {count, median, robust_mean, trimmed_mean, outliers}} in
+    one batch; grade is None unless grade fan-out is on.
+    """
+    grades = grades or [None] * len(queries)
+    keys = list(dict.fromkeys((normalize_query(q), g) for q, g in zip(queries, grades)))
+    since = window_start(days)
+    arrays = [comp_arrays(k, g, since)[1] for k, g in keys]
+    sizes = np.array([len(a) for a in arrays], dtype=np.int64)
+    prices = np.concatenate(arrays) if arrays else np.empty(0)
+    segments = np.repeat(np.arange(len(keys)), sizes)
+    stats = robust_stats_batch(prices, segments, len(keys))
+
+    out = {}
+    for i, key in enumerate(keys):
+        row = {}
+        for name, values in stats.items():
+            v = values[i]
+            if name in ("count", "outliers"):
+                row[name] = int(v)
+            else:
+                row[name] = None if np.isnan(v) else round(float(v), 2)
+        out[key] = row
+    return out
+
+
+BLOCK_MARKERS = [
+    "verify you are human",
+    "captcha",
+    "cloudflare",
+    "attention required",
+    "access denied",
+    "unusual traffic",
+    "temporarily blocked",
+    "robot",
+    "enable cookies",
+]
+
+NO_RESULTS_NOTE = "No-results marker on page"
+
+NO_RESULTS_MARKERS = [
+    "no results",
+    "no sales found",
+    "nothing found",
+]
+
+# Try multiple table selectors (130point has changed markup over time)
+TABLE_SELECTORS = [
+    "table tbody tr",
+    "table tr",  # fallback
+    ".table tbody tr",
+    ".sales-table tbody tr",
+]
+
+READY_TIMEOUT_MS = int(os.getenv("READY_TIMEOUT_MS", "15000"))
+
+# Selector that matched on the previous query; tried first next time
+_last_table_selector: Optional[str] = None
 
 
 def looks_blocked(text: str) -> bool:
     t = (text or "").lower()
-    blockers = [
-        "verify you are human",
-        "captcha",
-        "cloudflare",
-        "attention required",
-        "access denied",
-        "unusual traffic",
-        "temporarily blocked",
-        "robot",
-        "enable cookies",
-    ]
-    return any(b in t for b in blockers)
-
-
-async def scrape_130point_for_query(page, query: str) -> tuple[Optional[float], int, str, str]:
+    return any(b in t for b in BLOCK_MARKERS)
+
+
+def visible_text(html: str) -> str:
+    # Raw markup trips the markers (<meta name="robots">, cdnjs.cloudflare.com scripts)
+    tree = HTMLParser(html)
+    tree.strip_tags(["script", "style", "noscript"])
+    return tree.body.text(separator=" ") if tree.body is not None else ""
+
+
+def ordered_table_selectors() -> List[str]:
+    if _last_table_selector in TABLE_SELECTORS:
+        return [_last_table_selector] + [s for s in TABLE_SELECTORS if s != _last_table_selector]
+    return list(TABLE_SELECTORS)
+
+
+# Resolves with the first readiness signal: a data row (one with a <td>, so a header-only
+# table does not count), a block marker or a no-results marker
+READY_JS = """
+([sels, blockers, empties]) => {
+    for (const s of sels) {
+        if (Array.from(document.querySelectorAll(s)).some(tr => tr.querySelector("td"))) {
+            return {kind: "table", sel: s};
+        }
+    }
+    const t = ((document.body && document.body.innerText) || "").toLowerCase();
+    if (blockers.some(b => t.includes(b))) return {kind: "blocked"};
+    if (empties.some(b => t.includes(b))) return {kind: "empty"};
+    return false;
+}
+"""
+
+
+async def wait_for_ready(page, timeout: int = READY_TIMEOUT_MS) -> dict:
+    """
+    Races every table selector, the block markers and the no-results markers in one
+    wait_for_function and returns {"kind": "table"|"blocked"|"empty"|"timeout", ...}.
+    """
+    global _last_table_selector
+    try:
+        handle = await page.wait_for_function(
+            READY_JS,
+            arg=[ordered_table_selectors(), BLOCK_MARKERS, NO_RESULTS_MARKERS],
+            polling=100,
+            timeout=timeout,
+        )
+        ready = await handle.json_value()
+    except PlaywrightTimeoutError:
+        return {"kind": "timeout"}
+    except Exception as e:
+        return {"kind": "error", "error": str(e)}
+    if ready.get("kind") == "table":
+        _last_table_selector = ready.get("sel")
+    return ready
+
+
+# Returns [{text, cells}] for `limit` rows matching `sel` from index `start`, in one round trip
+ROWS_JS = """
+([sel, start, limit]) => Array.from(document.querySelectorAll(sel)).slice(start, start + limit).map(tr => ({
+    text: tr.innerText || "",
+    cells: Array.from(tr.querySelectorAll("td, th")).map(c => (c.innerText || "").trim()),
+}))
+"""
+
+
+async def extract_rows(
+    page, sel: str, limit: int = MAX_PARSE_ROWS, mode: str = EXTRACT_MODE, start: int = 0
+) -> List[dict]:
+    """
+    Returns up to `limit` rows from index `start` as {"text": ..., "cells": [...]}. The
+    evaluate mode does a single IPC call; on any failure it falls back to one inner_text
+    call per row.
+    """
+    if mode == "evaluate":
+        try:
+            rows = await page.evaluate(ROWS_JS, [sel, start, limit])
+            if isinstance(rows, list):
+                return rows
+        except Exception:
+            pass
+
+    out: List[dict] = []
+    rows = page.locator(sel)
+    n = min(await rows.count(), start + limit)
+    for i in range(start, n):
+        try:
+            txt = await rows.nth(i).inner_text(timeout=2000)
+        except Exception:
+            continue
+        out.append({"text": txt, "cells": []})
+    return out
+
+
+def sales_url(query: str) -> str:
+    return SALES_URL.format(query=re.sub(r"\s+", "+", query.strip()))
+
+
+Record = Tuple[Optional[datetime], float, str]  # (sale date, price, title)
+
+# Sale-format words that only some renderings of a row carry (a per-row innerText has them,
+# the title cell and capture payloads do not)
+SALE_TYPE_RE = re.compile(r"\b(?:best offer(?: accepted)?|auction|buy it now|fixed price|obo|bin)\b")
+
+
+def comp_title_key(title: str) -> str:
+    """Canonical title used to dedupe a sale across engines and extraction modes."""
+    t = DATE_TOKEN_RE.sub(" ", title or "")
+    t = re.sub(r"\$\s*[\d,]+(?:\.\d+)?", " ", t).lower()
+    t = SALE_TYPE_RE.sub(" ", t)
+    return re.sub(r"[^a-z0-9]+", " ", t).strip()
+
+
+def row_title(row: dict) -> str:
+    # Longest cell that is neither the price nor the date; else the text with those removed
+    cells = [c for c in row.get("cells") or [] if c and "$" not in c and not DATE_TOKEN_RE.fullmatch(c.strip())]
+    if cells:
+        return max(cells, key=len)[:300]
+    txt = DATE_TOKEN_RE.sub(" ", row.get("text") or "")
+    txt = re.sub(r"\$\s*[\d,]+(?:\.\d+)?", " ", txt)
+    return re.sub(r"\s+", " ", txt).strip()[:300]
+
+
+scan_stats = {"rows_scanned": 0, "early_stops": 0, "extra_pages": 0}
+
+
+class RowScanner:
+    """
+    Incremental parser for table rows arriving newest first, fed a chunk at a time.
+    `done` is set after `stop_after_old` consecutive rows older than `floor`, or once
+    `target` records are parsed (0 = no target).
+    """
+
+    def __init__(self, floor: Optional[datetime] = None, stop_after_old: int = STOP_AFTER_OLD_ROWS, target: int = 0):
+        self.floor = floor
+        self.stop_after_old = stop_after_old
+        self.target = target
+        self.records: List[Record] = []
+        self.seen = 0
+        self.done = False
+        self._old = 0
+
+    def feed(self, rows: List[dict]) -> bool:
+        for row in rows:
+            if self.done:
+                break
+            self.seen += 1
+            txt = row.get("text") or ""
+            dt = parse_date(txt)
+            if self.floor is not None and dt is not None and dt < self.floor:
+                self._old += 1
+                if self._old >= self.stop_after_old:
+                    self.done = True
+                continue
+            self._old = 0
+            price = parse_price(txt)
+            if price is not None:
+                self.records.append((dt, price, row_title(row)))
+                if self.target and len(self.records) >= self.target:
+                    self.done = True
+        return self.done
+
+
+def parse_records(rows: List[dict]) -> List[Record]:
+    """Parses every table row into a record (see RowScanner for the early-stopping scan)."""
+    scanner = RowScanner()
+    scanner.feed(rows)
+    return scanner.records
+
+
+def row_scanner(query: str) -> RowScanner:
+    # Rows older than the comp window, or than the latest stored sale, add nothing new
+    floor = window_start(COMP_WINDOW_DAYS)
+    latest = comp_store.latest(query)
+    if latest is not None and latest > floor:
+        floor = latest
+    return RowScanner(floor, STOP_AFTER_OLD_ROWS, TARGET_COMPS)
+
+
+def record_scan(scanner: RowScanner, pages: int):
+    scan_stats["rows_scanned"] += scanner.seen
+    scan_stats["early_stops"] += int(scanner.done)
+    scan_stats["extra_pages"] += max(0, pages - 1)
+
+
+DATE_KEYS = ("date", "sold_date", "solddate", "sale_date", "saledate", "end_date", "enddate", "endtime", "date_sold")
+PRICE_KEYS = ("price", "sold_price", "soldprice", "sale_price", "saleprice", "amount", "final_price")
+TITLE_KEYS = ("title", "name", "item_title", "listing_title")
+
+
+def parse_date_strict(value) -> Optional[datetime]:
+    """Non-fuzzy date parsing for structured payload fields (epoch or ISO-like strings)."""
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, (int, float)) or str(value).isdigit():
+            ts = float(value)
+            if ts > 1e12:  # epoch milliseconds
+                ts /= 1000
+            return datetime.fromtimestamp(ts, tz=timezone.utc)
+        dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except (ValueError, OverflowError, OSError):
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _pick(record: dict, keys) -> object:
+    lowered = {str(k).lower(): v for k, v in record.items()}
+    for k in keys:
+        if k in lowered:
+            return lowered[k]
+    return None
+
+
+def _find_records(obj) -> List[dict]:
+    # First list of dicts anywhere in the payload
+    if isinstance(obj, list):
+        if obj and all(isinstance(x, dict) for x in obj):
+            return obj
+        for x in obj:
+            found = _find_records(x)
+            if found:
+                return found
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            found = _find_records(v)
+            if found:
+                return found
+    return []
+
+
+def parse_capture_payload(body: str) -> List[Tuple[Optional[datetime], Optional[float], str]]:
+    """
+    Parses a captured backend response into (date, price, title) records. JSON payloads
+    are read field by field; HTML fragments fall back to the table-row parser.
+    """
+    body = body or ""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+
+    if data is not None:
+        records = []
+        for r in _find_records(data)[:MAX_PARSE_ROWS]:
+            price = _pick(r, PRICE_KEYS)
+            if isinstance(price, str):
+                price = parse_price(price if "$" in price else f"${price}")
+            elif isinstance(price, (int, float)):
+                price = float(price)
+            else:
+                price = None
+            if price is None:
+                continue
+            title = _pick(r, TITLE_KEYS)
+            records.append((parse_date_strict(_pick(r, DATE_KEYS)), price, "" if title is None else str(title)))
+        return records
+
+    if "<tr" in body and "<table" not in body:
+        body = f"<table>{body}</table>"
+    return parse_records(parse_sales_html(body))
+
+
+async def capture_sales_payload(page, url: str, timeout: int = CAPTURE_TIMEOUT_MS) -> Tuple[list, str]:
+    """
+    Navigates to `url` and resolves as soon as the page's own XHR/fetch data response
+    lands. Returns (records, "") or ([], reason); the page is left loaded either way.
+    """
+    loop = asyncio.get_running_loop()
+    landed: asyncio.Future = loop.create_future()
+    pattern = re.compile(CAPTURE_URL_PATTERN, re.I)
+
+    def on_response(resp):
+        if landed.done():
+            return
+        if resp.request.resource_type in ("xhr", "fetch") and pattern.search(resp.url):
+            landed.set_result(resp)
+
+    page.on("response", on_response)
+    try:
+        try:
+            await page.goto(url, wait_until="commit", timeout=45000)
+        except PlaywrightTimeoutError as e:
+            return [], f"Navigation timeout: {e}"
+        except Exception as e:
+            return [], f"Navigation error: {e}"
+        try:
+            resp = await asyncio.wait_for(landed, timeout / 1000)
+            body = await resp.text()
+        except asyncio.TimeoutError:
+            return [], "No data response captured"
+        except Exception as e:
+            return [], f"Capture error: {e}"
+    finally:
+        page.remove_listener("response", on_response)
+
+    records = await run_blocking(parse_capture_payload, body)
+    if not records:
+        return [], "Captured response had no sales records"
+    return records, ""
+
+
+def price_records(query: str, records: List[Record]):
+    """Stores newly seen comps and prices the query from everything stored for it."""
+    comp_store.add(query, records)
+    _days, prices = comp_store.arrays(query, window_start(90))
+    return avg_90d(prices)
+
+
+# "Load more" controls append rows; next-page controls replace them (or navigate). Exact
+# text only (:text-is), and "Next" only inside a pagination container, so listing links
+# such as "... Next Level ..." never match; anything inside the results table is skipped
+NEXT_PAGE_SELECTORS = [
+    "button:text-is('Load more')",
+    "button:text-is('Load More')",
+    "a:text-is('Load more')",
+    "a:text-is('Load More')",
+    "a[rel='next']",
+    ".pagination .next a",
+    ".pagination a:text-is('Next')",
+]
+
+# Resolves once rows beyond the first `n` exist, or the first row changed
+MORE_ROWS_JS = """
+([sel, n, first]) => {
+    const rows = document.querySelectorAll(sel);
+    if (rows.length > n) return "appended";
+    if (rows.length && rows[0].innerText !== first) return "replaced";
+    return false;
+}
+"""
+
+
+async def next_result_page(page, sel: str) -> Optional[int]:
+    """
+    Clicks the first visible "load more" / next-page control and waits for new rows.
+    Returns the index the new rows start at (0 if the page was replaced), or None if
+    there is no control or nothing new arrived.
+    """
+    for ctl in NEXT_PAGE_SELECTORS:
+        loc = page.locator(ctl).first
+        try:
+            if not await loc.is_visible() or await loc.evaluate("el => !!el.closest('table')"):
+                continue
+        except Exception:
+            continue
+        try:
+            n = await page.locator(sel).count()
+            first = await page.locator(sel).first.inner_text(timeout=2000) if n else ""
+            await upstream_limiter.acquire()
+            await loc.click(timeout=5000)
+        except Exception:
+            return None
+        try:
+            handle = await page.wait_for_function(
+                MORE_ROWS_JS, arg=[sel, n, first], polling=100, timeout=PAGE_TIMEOUT_MS
+            )
+            return n if await handle.json_value() == "appended" else 0
+        except PlaywrightTimeoutError:
+            return None
+        except Exception:
+            # The control navigated away; wait for the next page's table instead
+            ready = await wait_for_ready(page, PAGE_TIMEOUT_MS)
+            return 0 if ready["kind"] == "table" and ready.get("sel") == sel else None
+    return None
+
+
+async def scan_result_pages(page, sel: str, scanner: RowScanner) -> int:
+    """
+    Feeds `scanner` ROW_CHUNK rows at a time (at most MAX_PARSE_ROWS per page) and stops
+    as soon as it is done; pages further only while it is not. Returns pages read.
+    """
+    pages, offset, start = 1, 0, 0
+    while True:
+        while start - offset < MAX_PARSE_ROWS:
+            limit = min(ROW_CHUNK, offset + MAX_PARSE_ROWS - start)
+            rows = await extract_rows(page, sel, limit=limit, start=start)
+            if not rows:
+                break
+            start += len(rows)
+            if await run_blocking(scanner.feed, rows):
+                return pages
+        if pages >= MAX_RESULT_PAGES:
+            return pages
+        offset = await next_result_page(page, sel)
+        if offset is None:
+            return pages
+        pages += 1
+        start = offset
+
+
+async def scrape_130point_for_query(page, query: str, capture: bool = False) -> tuple[Optional[float], int, str, str]:
     """
     Returns: (avg_price_90d, comps_90d, notes, url_used)
+
+    With capture=True the backend data response is parsed directly; the rendered DOM
+    is only scraped if no usable payload is captured.
     """
     q = query.strip()
     if not q:
         return None, 0, "Empty query.", ""
 
-    url = SALES_URL.format(query=re.sub(r"\s+", "+", q))
+    url = sales_url(q)
 
-    # Navigate
-    try:
-        await page.goto(url, wait_until="domcontentloaded", timeout=45000)
-    except Exception as e:
-        return None, 0, f"Navigation error: {e}", url
+    if capture:
+        records, reason = await capture_sales_payload(page, url)
+        if records:
+            avg, comps, notes = await run_blocking(price_records, q, records)
+            if comps > 0:
+                return avg, comps, "", url
+        if reason.startswith(("Navigation error", "Navigation timeout")):
+            return None, 0, reason, url
+    else:
+        # Navigate
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=45000)
+        except PlaywrightTimeoutError as e:
+            return None, 0, f"Navigation timeout: {e}", url
+        except Exception as e:
+            return None, 0, f"Navigation error: {e}", url
 
-    # Give client-side JS time to render (130point can be slow)
-    await page.wait_for_timeout(1500)
+    # Wait for whichever comes first: rows, a block page or an empty result (130point can be slow)
+    ready = await wait_for_ready(page)
 
     # Quick block detection
     try:
@@ -133,36 +1690,22 @@ async def scrape_130point_for_query(page, query: str) -> tuple[Optional[float],
         snippet = (body_txt[:180] + "…") if body_txt else ""
         return None, 0, f"Blocked/Captcha suspected. title='{title}' snippet='{snippet}'", url
 
-    # Try multiple table selectors (130point has changed markup over time)
-    table_selectors = [
-        "table tbody tr",
-        "table tr",  # fallback
-        ".table tbody tr",
-        ".sales-table tbody tr",
-    ]
-
-    rows_found = 0
-    last_err = ""
-    for sel in table_selectors:
+    if ready["kind"] == "timeout":
+        last_err = f"Timeout after {READY_TIMEOUT_MS} ms waiting for results"
+    elif ready["kind"] == "empty":
+        last_err = NO_RESULTS_NOTE
+    else:
+        last_err = ready.get("error", "")
+
+    for sel in ordered_table_selectors():
         try:
-            await page.wait_for_selector(sel, timeout=12000)
-            rows = page.locator(sel)
-            rows_found = await rows.count()
+            # Header-only tables (no <td> rows) are not results
+            rows_found = await page.locator(f"{sel}:has(td)").count()
             if rows_found > 0:
-                # Parse rows
-                sales: List[Tuple[Optional[datetime], Optional[float]]] = []
-                n = min(rows_found, 200)  # cap parsing work
-                for i in range(n):
-                    try:
-                        txt = await rows.nth(i).inner_text(timeout=2000)
-                    except Exception:
-                        continue
-                    dt = parse_date(txt)
-                    price = parse_price(txt)
-                    if price is not None:
-                        sales.append((dt, price))
-
-                avg, comps, notes = avg_90d(sales)
+                # Parse chunk by chunk off the event loop, stopping once past the window
+                scanner = await run_blocking(row_scanner, q)
+                record_scan(scanner, await scan_result_pages(page, sel, scanner))
+                avg, comps, notes = await run_blocking(price_records, q, scanner.records)
                 if comps == 0:
                     # We found rows but didn't parse date+price reliably
                     title = ""
@@ -174,8 +1717,6 @@ async def scrape_130point_for_query(page, query: str) -> tuple[Optional[float],
 
                 return avg, comps, "", url
 
-        except PlaywrightTimeoutError:
-            last_err = f"Timeout waiting for selector: {sel}"
         except Exception as e:
             last_err = f"Error with selector {sel}: {e}"
 
@@ -189,76 +1730,913 @@ async def scrape_130point_for_query(page, query: str) -> tuple[Optional[float],
     return None, 0, f"No results table found. title='{title}'. {last_err}. snippet='{snippet}'", url
 
 
-@app.post("/price/spreadsheet")
-async def price_spreadsheet(file: UploadFile = File(...)):
-    if not (file.filename or "").lower().endswith(".xlsx"):
-        raise HTTPException(status_code=400, detail="Please upload an .xlsx file.")
+def _sales_nodes(tree: HTMLParser) -> list:
+    for sel in ordered_table_selectors():
+        nodes = tree.css(sel)
+        if any(n.css_first("td") is not None for n in nodes):
+            return nodes
+    return []
+
+
+def _sales_row(node) -> dict:
+    return {"text": node.text(separator="\t"), "cells": [c.text(strip=True) for c in node.css("td, th")]}
+
+
+def parse_sales_html(html: str, limit: int = MAX_PARSE_ROWS) -> List[dict]:
+    return [_sales_row(n) for n in _sales_nodes(HTMLParser(html))[:limit]]
+
+
+def scan_sales_html(scanner: RowScanner, html: str) -> Tuple[int, Optional[str]]:
+    """
+    Feeds the page's rows to `scanner` one at a time, building only the rows it reads.
+    Returns (rows read, next-page href or None when done or there is no next page).
+    """
+    tree = HTMLParser(html)
+    n = 0
+    for node in _sales_nodes(tree)[:MAX_PARSE_ROWS]:
+        n += 1
+        if scanner.feed([_sales_row(node)]):
+            return n, None
+    link = tree.css_first("a[rel='next']")
+    return n, (link.attributes.get("href") or None) if link is not None else None
+
+
+async def scrape_130point_http(query: str) -> Tuple[Optional[tuple], str]:
+    """
+    Direct-HTTP engine. Returns (result, "") when the static HTML already holds
+    priced comps, or (None, reason) when the caller should fall back to the browser.
+    """
+    q = query.strip()
+    if not q:
+        return (None, 0, "Empty query.", ""), ""
+    if http_client is None:
+        return None, "HTTP client not started"
+
+    url = sales_url(q)
+    try:
+        resp = await http_client.get(url)
+    except httpx.TimeoutException as e:
+        return None, f"HTTP timeout: {e}"
+    except Exception as e:
+        return None, f"HTTP error: {e}"
+    if resp.status_code != 200:
+        return None, f"HTTP {resp.status_code}"
+
+    html = resp.text
+    if not html.strip():
+        return None, "Empty response"
+    if looks_blocked(await run_blocking(visible_text, html)):
+        return None, "Blocked/Captcha suspected"
+
+    scanner = await run_blocking(row_scanner, q)
+    rows_found, next_href = await run_blocking(scan_sales_html, scanner, html)
+    if not rows_found:
+        return None, "No static results table (needs JS)"
+
+    pages = 1
+    while next_href and pages < MAX_RESULT_PAGES:
+        await upstream_limiter.acquire()
+        try:
+            resp = await http_client.get(urljoin(str(resp.url), next_href))
+        except Exception:
+            break
+        if resp.status_code != 200 or looks_blocked(await run_blocking(visible_text, resp.text)):
+            break
+        more, next_href = await run_blocking(scan_sales_html, scanner, resp.text)
+        if not more:
+            break
+        rows_found += more
+        pages += 1
+    record_scan(scanner, pages)
+
+    avg, comps, notes = await run_blocking(price_records, q, scanner.records)
+    if comps == 0:
+        return None, f"Found table rows ({rows_found}) but parsed 0 comps"
+    return (avg, comps, "", url), ""
+
+
+# Single-flight: normalized query -> future of the fetch currently running for it, shared
+# by every concurrent upload that needs the same query
+_inflight: dict = {}
+singleflight_stats = {"leaders": 0, "hits": 0}
+
+
+async def scrape_queries(
+    queries: List[str],
+    workers: int = SCRAPE_WORKERS,
+    engine: str = SCRAPE_ENGINE,
+    on_result: Optional[Callable[[str, tuple, Optional[float]], None]] = None,
+    stats: Optional[dict] = None,
+    max_stale: Optional[float] = None,
+    use_cache: bool = True,
+) -> Tuple[dict, dict]:
+    """
+    Runs one scrape per distinct query on up to `workers` concurrent workers. With the
+    "http" engine a worker only leases a browser page once a query needs the fallback.
+    Cached queries are answered without touching the network; every upstream request
+    goes through the shared limiter, and a query another upload is already fetching is
+    awaited instead of fetched again. `on_result(key, result, elapsed_s)` fires as each
+    distinct query resolves (elapsed_s is None for cache hits) and `stats` (if given)
+    is updated live. With `max_stale` (seconds past the TTL), expired cache entries are
+    served at once, listed in stats["stale_ages"], and refreshed in the background.
+    Returns ({normalized_query: (avg, comps, notes, url)}, stats).
+    """
+    results: dict = {}
+    if stats is None:
+        stats = {}
+    for k in (
+        "cache_hits", "negative_hits", "fetched", "http_served", "browser_fallbacks",
+        "blocked", "requeued", "singleflight_hits", "singleflight_refetches",
+    ):
+        stats.setdefault(k, 0)
+    stats.setdefault("stale_ages", {})
+    owned: dict = {}  # key -> in-flight future this call is responsible for
+    waiters: list = []
+
+    def done(key: str, res: tuple, elapsed: Optional[float] = None):
+        results[key] = res
+        fut = owned.pop(key, None)
+        if fut is not None:
+            _inflight.pop(key, None)
+            if not fut.done():
+                fut.set_result(res)
+        if on_result is not None:
+            on_result(key, res, elapsed)
+
+    async def follow(key: str, q: str, fut: asyncio.Future):
+        t0 = time.perf_counter()
+        try:
+            res = await asyncio.shield(fut)
+        except (asyncio.CancelledError, Exception) as e:
+            if isinstance(e, asyncio.CancelledError) and not fut.cancelled():
+                raise  # we are being cancelled ourselves
+            # the leading upload went away before finishing: fetch it ourselves
+            stats["singleflight_refetches"] += 1
+            queue.put_nowait((key, q, 0))
+            return
+        done(key, res, time.perf_counter() - t0)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for q in queries:
+        key = normalize_query(q)
+        if key in results:
+            continue
+        hit = result_cache.lookup(q) if use_cache else None
+        if hit is not None and hit[1] <= result_cache.ttl:
+            stats["cache_hits"] += 1
+            done(key, hit[0])
+        elif hit is not None and max_stale is not None and hit[1] <= result_cache.ttl + max_stale:
+            avg, comps, notes, url = hit[0]
+            age_h = round(hit[1] / 3600, 1)
+            stats["cache_hits"] += 1
+            stats["stale_ages"][key] = age_h
+            schedule_refresh(q, engine)
+            done(key, (avg, comps, f"Stale cached result ({age_h}h old); refresh scheduled. {notes}".strip(), url))
+        elif use_cache and (neg := negative_cache.get(q)) is not None:
+            # recently came back empty/unparseable/blocked: don't pay for it again yet
+            stats["negative_hits"] += 1
+            done(key, neg)
+        else:
+            results[key] = None  # placeholder so duplicates are queued once
+            queue.put_nowait((key, q, 0))
+
+    async def worker():
+        async with AsyncExitStack() as stack:
+            page = None
+            while True:
+                try:
+                    key, q, attempts = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if key not in owned:
+                    shared = _inflight.get(key)
+                    if shared is not None:
+                        # another upload is fetching this query right now: share its result
+                        stats["singleflight_hits"] += 1
+                        singleflight_stats["hits"] += 1
+                        waiters.append(asyncio.create_task(follow(key, q, shared)))
+                        continue
+                    owned[key] = _inflight[key] = asyncio.get_running_loop().create_future()
+                    singleflight_stats["leaders"] += 1
+                # hold off entirely while 130point is blocking us (half-open lets one probe through)
+                probe = await upstream_breaker.before_request()
+                try:
+                    # polite, process-wide rate limiting (important)
+                    await upstream_limiter.acquire()
+                    stats["fetched"] += 1
+                    t0 = time.perf_counter()
+                    res = None
+                    t_final = t0
+                    if engine == "http":
+                        res, reason = await scrape_130point_http(q)
+                        if res is not None:
+                            stats["http_served"] += 1
+                            outcome = reason
+                        else:
+                            stats["browser_fallbacks"] += 1
+                            await upstream_limiter.acquire()
+                    if res is None:
+                        t_final = time.perf_counter()
+                        try:
+                            if page is None:
+                                # IMPORTANT: Pages are leased from the app-wide browser pool (no Chromium launch per upload)
+                                page = await stack.enter_async_context(browser_pool.page())
+                            res = await scrape_130point_for_query(page, q, capture=engine == "capture")
+                        except Exception as e:
+                            res = (None, 0, f"Scrape error: {e}", "")
+                        outcome = res[2]
+                    # one pacer sample per query, from the request that produced the result
+                    upstream_limiter.record(*classify_outcome(outcome), latency=time.perf_counter() - t_final)
+                    blocked = res[2].startswith("Blocked")
+                    upstream_breaker.record(blocked, probe)
+                finally:
+                    upstream_breaker.release(probe)
+                if blocked:
+                    stats["blocked"] += 1
+                    if attempts < BREAKER_MAX_REQUEUES:
+                        # retry once the breaker lets traffic through again
+                        stats["requeued"] += 1
+                        queue.put_nowait((key, q, attempts + 1))
+                        continue
+                if res[0] is not None and res[1] > 0:
+                    result_cache.set(q, res)
+                    negative_cache.discard(q)
+                else:
+                    negative_cache.set(q, res)
+                done(key, res, time.perf_counter() - t0)
+
+    followed = 0
+    try:
+        # followers of an abandoned fetch put it back on the queue, so go round again
+        while True:
+            if not queue.empty():
+                n = max(1, min(workers, queue.qsize(), browser_pool.max_pages))
+                await asyncio.gather(*(worker() for _ in range(n)))
+            if followed == len(waiters):
+                break
+            batch, followed = waiters[followed:], len(waiters)
+            await asyncio.gather(*batch)
+    finally:
+        # never leave other uploads waiting on a fetch we abandoned
+        for key, fut in owned.items():
+            _inflight.pop(key, None)
+            fut.cancel()
+        for w in waiters:
+            w.cancel()
+    return results, stats
+
+
+_refreshing: dict = {}  # normalized query -> background refresh task
+
+
+def schedule_refresh(query: str, engine: str = SCRAPE_ENGINE):
+    """Re-fetches a stale query in the background through the normal rate-limited path."""
+    key = normalize_query(query)
+    if key in _refreshing:
+        return
+
+    async def refresh():
+        try:
+            await scrape_queries([query], workers=1, engine=engine, use_cache=False)
+        finally:
+            _refreshing.pop(key, None)
+
+    _refreshing[key] = asyncio.create_task(refresh())
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+OUT_COLS = [
+    "Avg Sold Price (90d, USD)",
+    "# Sold Comps (90d)",
+    "Source",
+    "Query Used",
+    "Notes",
+]
+
+
+def check_engine(engine: str):
+    if engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(ENGINES)}.")
+
+
+# Columns the pricer itself reads; everything else is only carried through to the output
+INPUT_COLS = ["Item", "Grade"]
+
+UPLOAD_FORMATS = {".xlsx": "xlsx", ".csv": "csv", ".tsv": "tsv", ".parquet": "parquet"}
+
+
+def upload_format(filename: str) -> str:
+    ext = os.path.splitext((filename or "").lower())[1]
+    if ext not in UPLOAD_FORMATS:
+        raise HTTPException(status_code=400, detail="Please upload an .xlsx, .csv, .tsv or .parquet file.")
+    return UPLOAD_FORMATS[ext]
+
+
+def output_name(filename: str) -> str:
+    stem = os.path.splitext(filename or "cards.xlsx")[0]
+    return f"priced_{stem}.xlsx"
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    upload_format(file.filename)
 
     raw = await file.read()
     if not raw:
         raise HTTPException(status_code=400, detail="Empty file.")
+    return raw
+
+
+def _use_calamine() -> bool:
+    if XLSX_READER == "openpyxl":
+        return False
+    return importlib.util.find_spec("python_calamine") is not None
 
-    df = pd.read_excel(BytesIO(raw))
+
+def _dedupe_headers(names: List[str]) -> List[str]:
+    # Like pd.read_excel: a repeated header gets the first free ".N" suffix, and every
+    # original header name is reserved first so a real "Item.1" column keeps its name
+    taken = set(names)
+    first: set = set()
+    last_suffix: dict = {}
+    out = []
+    for n in names:
+        if n not in first:
+            first.add(n)
+            out.append(n)
+            continue
+        k = last_suffix.get(n, 0) + 1
+        while f"{n}.{k}" in taken:
+            k += 1
+        last_suffix[n] = k
+        taken.add(f"{n}.{k}")
+        out.append(f"{n}.{k}")
+    return out
+
+
+def _read_xlsx_streaming(raw: bytes, columns: Optional[List[str]]) -> pd.DataFrame:
+    # openpyxl read-only mode streams rows from the sheet XML instead of building cells
+    wb = load_workbook(BytesIO(raw), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        names = _dedupe_headers([f"Unnamed: {i}" if h is None else str(h) for i, h in enumerate(header)])
+        keep = [i for i, n in enumerate(names) if columns is None or n in columns]
+        data = [[r[i] if i < len(r) else None for i in keep] for r in rows]
+    finally:
+        wb.close()
+    # read-only sheets often report trailing blank rows
+    while data and all(v is None for v in data[-1]):
+        data.pop()
+    return pd.DataFrame(data, columns=[names[i] for i in keep])
+
+
+def read_sheet(raw: bytes, fmt: str = "xlsx", columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Parses an upload into a DataFrame. With `columns`, only those columns are read
+    (missing ones are simply absent) so large inventories stay cheap to ingest.
+    """
+    usecols = (lambda c: str(c) in columns) if columns else None
+    if fmt in ("csv", "tsv"):
+        return pd.read_csv(BytesIO(raw), sep="\t" if fmt == "tsv" else ",", usecols=usecols)
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Parquet uploads need pyarrow installed on the server.")
+        pf = pq.ParquetFile(BytesIO(raw))
+        cols = [c for c in pf.schema_arrow.names if c in columns] if columns else None
+        return pf.read(columns=cols).to_pandas()
+    if _use_calamine():
+        return pd.read_excel(BytesIO(raw), engine="calamine", usecols=usecols)
+    return _read_xlsx_streaming(raw, columns)
+
+
+def load_sheet(raw: bytes, filename: str = "cards.xlsx", columns: Optional[List[str]] = None) -> pd.DataFrame:
+    try:
+        df = read_sheet(raw, upload_format(filename), columns)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read spreadsheet: {e}")
     if df.empty:
         raise HTTPException(status_code=400, detail="Spreadsheet has no rows.")
 
     # Ensure output columns exist
-    out_cols = [
-        "Avg Sold Price (90d, USD)",
-        "# Sold Comps (90d)",
-        "Source",
-        "Query Used",
-        "Notes",
-    ]
-    for c in out_cols:
+    for c in OUT_COLS:
         if c not in df.columns:
             df[c] = ""
 
     if "Item" not in df.columns:
         raise HTTPException(status_code=400, detail="Expected an 'Item' column in the sheet.")
+    return df
+
+
+def sheet_queries(df: pd.DataFrame) -> List[str]:
+    # Build every row's query up front so repeated card/grade rows are scraped once
+    items = df["Item"].fillna("").astype(str).tolist()
+    grades = df["Grade"].tolist() if "Grade" in df.columns else [None] * len(df)
+    return [build_query(item, clean_grade(grade)) for item, grade in zip(items, grades)]
+
+
+def sheet_fetch_plan(df: pd.DataFrame, grade_fanout: bool = False) -> Tuple[List[str], List[Optional[str]]]:
+    """
+    (query to fetch, grade to filter comps by) per row. Normally the query already holds
+    the grade; with grade fan-out every grade of a card shares the ungraded base query.
+    """
+    if not grade_fanout:
+        return sheet_queries(df), [None] * len(df)
+    items = df["Item"].fillna("").astype(str).tolist()
+    grades = df["Grade"].tolist() if "Grade" in df.columns else [None] * len(df)
+    return [build_query(item, None) for item in items], [clean_grade(g) for g in grades]
+
+
+def grade_result(query: str, grade: Optional[str], base: tuple) -> tuple:
+    """Per-grade 90d result for a fan-out row, from the base query's stored comps."""
+    avg, comps, notes, url = base
+    if grade is None or (avg is None and not comps):
+        return base
+    _days, prices = comp_store.graded_arrays(query, ("PSA", grade), window_start(90))
+    avg, comps, notes = avg_90d(prices)
+    if not comps:
+        notes = f"No PSA {grade} comps among base-query results in last 90 days."
+    return avg, comps, notes, url
+
+
+async def price_dataframe(
+    df: pd.DataFrame,
+    engine: str = SCRAPE_ENGINE,
+    on_rows: Optional[Callable[[List[int], tuple, Optional[float]], None]] = None,
+    stats: Optional[dict] = None,
+    windows: Optional[List[int]] = None,
+    max_stale: Optional[float] = None,
+    grade_fanout: bool = False,
+    fill: bool = True,
+) -> dict:
+    """
+    Prices every row of `df` in place. `on_rows(row_indexes, result, elapsed_s)` fires as
+    soon as a distinct query resolves, with every row that shares it. Per-window stats
+    columns are filled from the local comp store. With `max_stale`, stale cache entries
+    are served (see scrape_queries) and flagged in a "Stale Cache Age (h)" column.
+    With `grade_fanout`, each card's ungraded base query is fetched once and every
+    graded row is priced from the comps whose titles match its PSA grade. With
+    fill=False only `on_rows` sees results and `df` is left untouched (streaming).
+    Returns the stats.
+    """
+    queries, grades = await run_blocking(sheet_fetch_plan, df, grade_fanout)
+    rows_by_key: dict = {}
+    for idx, q in enumerate(queries):
+        rows_by_key.setdefault(normalize_query(q), []).append(idx)
+
+    graded: dict = {}  # (key, grade) -> per-grade result, fan-out mode only
+    fan_outs: list = []
+
+    async def fan_out(key: str, res: tuple, elapsed: Optional[float]):
+        by_grade: dict = {}
+        for idx in rows_by_key.get(key, []):
+            by_grade.setdefault(grades[idx], []).append(idx)
+        for grade, grade_rows in by_grade.items():
+            graded[(key, grade)] = await run_blocking(grade_result, key, grade, res)
+            on_rows(grade_rows, graded[(key, grade)], elapsed)
+
+    def on_result(key: str, res: tuple, elapsed: Optional[float]):
+        if on_rows is None:
+            return
+        if grade_fanout:
+            # comp-store reads + title regexes: keep them off the event loop
+            fan_outs.append(asyncio.create_task(fan_out(key, res, elapsed)))
+        else:
+            on_rows(rows_by_key.get(key, []), res, elapsed)
+
+    try:
+        results, stats = await scrape_queries(
+            queries, engine=engine, on_result=on_result, stats=stats, max_stale=max_stale
+        )
+        await asyncio.gather(*fan_outs)
+    finally:
+        for task in fan_outs:
+            task.cancel()
+    if grade_fanout:
+        distinct = len({normalize_query(q) for q in await run_blocking(sheet_queries, df)})
+        stats["dedup_saved"] = len(queries) - distinct
+        stats["grade_fanout_saved"] = max(0, distinct - len(results))
+    else:
+        stats["dedup_saved"] = len(queries) - len(results)
+    if not fill:
+        return stats
+    await run_blocking(apply_results, df, queries, results, grades, graded)
+    if max_stale is not None:
+        ages = stats["stale_ages"]
+        df["Stale Cache Age (h)"] = [ages.get(normalize_query(q), "") for q in queries]
+    await run_blocking(apply_window_stats, df, queries, windows or PRICE_WINDOWS, grades)
+    return stats
+
+
+def apply_results(
+    df: pd.DataFrame,
+    queries: List[str],
+    results: dict,
+    grades: Optional[List[Optional[str]]] = None,
+    graded: Optional[dict] = None,
+):
+    # `graded`: per-grade results already computed while streaming, keyed (key, grade)
+    grades = grades or [None] * len(queries)
+    per_key: dict = dict(graded or {})
+    for q, g in zip(queries, grades):
+        key = normalize_query(q)
+        if (key, g) not in per_key:
+            per_key[(key, g)] = grade_result(key, g, results[key]) if g else results[key]
+    rows = [per_key[(normalize_query(q), g)] for q, g in zip(queries, grades)]
+    df["Avg Sold Price (90d, USD)"] = ["" if r[0] is None else r[0] for r in rows]
+    df["# Sold Comps (90d)"] = [int(r[1]) for r in rows]
+    df["Source"] = SOURCE_NAME
+    df["Query Used"] = [r[3] or q for r, q in zip(rows, queries)]
+    df["Notes"] = [r[2] for r in rows]
+
+
+def apply_window_stats(
+    df: pd.DataFrame, queries: List[str], windows: List[int], grades: Optional[List[Optional[str]]] = None
+):
+    # One comp-store read + one stats pass per distinct query (and grade); no upstream traffic
+    grades = grades or [None] * len(queries)
+    keys = [(normalize_query(q), g) for q, g in zip(queries, grades)]
+    by_key = {}
+    for key, g in keys:
+        if (key, g) not in by_key:
+            by_key[(key, g)] = query_window_stats(key, windows, g)
+    per_row = [by_key[k] for k in keys]
+    for w in windows:
+        for stat, col in window_columns(w).items():
+            df[col] = ["" if r[w][stat] is None else r[w][stat] for r in per_row]
+
+    # Outlier-rejected 90d price for every row from one batched kernel call
+    robust = robust_stats_for_queries(queries, grades=grades)
+    rows = [robust[k] for k in keys]
+    df["Robust Avg (90d, USD)"] = ["" if r["robust_mean"] is None else r["robust_mean"] for r in rows]
+    df["# Outliers Rejected (90d)"] = [r["outliers"] for r in rows]
+
+
+def _cell(v):
+    return None if v is None or (not isinstance(v, str) and pd.isna(v)) else v
+
+
+def write_workbook(df: pd.DataFrame, dest) -> None:
+    """
+    Writes `df` with openpyxl's write-only (streaming) workbook so rows are serialized
+    as they go instead of building a full cell object tree. `dest` is a path or file.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([str(c) for c in df.columns])
+    for row in df.itertuples(index=False, name=None):
+        ws.append([_cell(v) for v in row])
+    wb.save(dest)
+
+
+def spool_workbook(df: pd.DataFrame) -> str:
+    """Writes the workbook to a temp file (deleted after the response is sent)."""
+    fd, path = tempfile.mkstemp(prefix="priced_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_workbook(df, path)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
 
-    # IMPORTANT: One Playwright browser/context/page per upload (much faster, less blocky)
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/123.0.0.0 Safari/537.36"
-            ),
-            locale="en-US",
-            viewport={"width": 1280, "height": 800},
+
+def stale_bound(serve_stale: bool, max_stale_hours: Optional[float]) -> Optional[float]:
+    if not serve_stale:
+        return None
+    if max_stale_hours is None:
+        return float(STALE_MAX_SECONDS)
+    return max(0.0, min(max_stale_hours * 3600, float(STALE_MAX_SECONDS)))
+
+
+@app.post("/price/spreadsheet")
+async def price_spreadsheet(
+    file: UploadFile = File(...),
+    engine: str = SCRAPE_ENGINE,
+    windows: Optional[str] = None,
+    serve_stale: bool = False,
+    max_stale_hours: Optional[float] = None,
+    grade_fanout: bool = False,
+):
+    check_engine(engine)
+    window_days = parse_windows(windows)
+    max_stale = stale_bound(serve_stale, max_stale_hours)
+    df = await run_blocking(load_sheet, await read_upload(file), file.filename)
+    stats = await price_dataframe(
+        df, engine=engine, windows=window_days, max_stale=max_stale, grade_fanout=grade_fanout
+    )
+
+    path = await run_blocking(spool_workbook, df)
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        filename=output_name(file.filename),
+        background=BackgroundTask(os.unlink, path),
+        headers={
+            "X-Cache-Hits": str(stats["cache_hits"]),
+            "X-Upstream-Fetches": str(stats["fetched"]),
+            "X-Dedup-Saved": str(stats["dedup_saved"]),
+            "X-Http-Served": str(stats["http_served"]),
+            "X-Stale-Served": str(len(stats["stale_ages"])),
+            "X-Grade-Fanout-Saved": str(stats.get("grade_fanout_saved", 0)),
+        },
+    )
+
+
+STREAM_FORMATS = ("ndjson", "sse")
+
+
+@app.post("/price/spreadsheet/stream")
+async def price_spreadsheet_stream(
+    file: UploadFile = File(...),
+    engine: str = SCRAPE_ENGINE,
+    format: str = "ndjson",
+    windows: Optional[str] = None,
+    serve_stale: bool = False,
+    max_stale_hours: Optional[float] = None,
+    grade_fanout: bool = False,
+):
+    """
+    Streams one event per row as soon as its query resolves (rows arrive out of order;
+    "row" is the 0-based sheet row), then a final {"done": true, ...} event.
+    """
+    check_engine(engine)
+    window_days = parse_windows(windows)
+    max_stale = stale_bound(serve_stale, max_stale_hours)
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STREAM_FORMATS)}.")
+    # Only Item/Grade are needed here: no workbook is written back
+    df = await run_blocking(load_sheet, await read_upload(file), file.filename, INPUT_COLS)
+    queries, grades = await run_blocking(sheet_fetch_plan, df, grade_fanout)
+    items = df["Item"].fillna("").astype(str).tolist()
+
+    events: asyncio.Queue = asyncio.Queue()
+    stats: dict = {}
+
+    def on_rows(rows: List[int], res: tuple, elapsed: Optional[float]):
+        avg, comps, notes, url = res
+        stale_age = stats.get("stale_ages", {}).get(normalize_query(queries[rows[0]])) if rows else None
+        for idx in rows:
+            events.put_nowait({
+                "row": idx,
+                "item": items[idx],
+                "query": queries[idx],
+                "grade": grades[idx],
+                "avg": avg,
+                "comps": int(comps),
+                "notes": notes,
+                "url": url,
+                "cached": elapsed is None,
+                "stale_age_h": stale_age,
+                "elapsed_ms": None if elapsed is None else round(elapsed * 1000),
+            })
+
+    async def run():
+        try:
+            await price_dataframe(
+                df,
+                engine=engine,
+                on_rows=on_rows,
+                stats=stats,
+                windows=window_days,
+                max_stale=max_stale,
+                grade_fanout=grade_fanout,
+                fill=False,
+            )
+            summary = {k: v for k, v in stats.items() if k != "stale_ages"}
+            events.put_nowait({"done": True, "rows": len(df), "stale_served": len(stats["stale_ages"]), **summary})
+        except Exception as e:
+            events.put_nowait({"done": True, "error": str(e)})
+
+    def encode(event: dict) -> str:
+        data = json.dumps(event)
+        if format == "sse":
+            return f"event: {'done' if event.get('done') else 'row'}\ndata: {data}\n\n"
+        return data + "\n"
+
+    def comp_stats(query: str, grade: Optional[str]) -> Tuple[dict, dict]:
+        window = query_window_stats(query, window_days, grade)
+        robust = robust_stats_for_queries([query], 90, [grade])
+        return {str(w): v for w, v in window.items()}, next(iter(robust.values()))
+
+    async def gen():
+        task = asyncio.create_task(run())
+        by_key: dict = {}  # (normalized query, grade) -> comp stats, shared by rows of a query
+        try:
+            while True:
+                event = await events.get()
+                if "row" in event:
+                    key = (normalize_query(event["query"]), event["grade"])
+                    if key not in by_key:
+                        by_key[key] = await run_blocking(comp_stats, event["query"], event["grade"])
+                    event["windows"], event["robust_90d"] = by_key[key]
+                yield encode(event)
+                if event.get("done"):
+                    return
+        finally:
+            # client went away: stop scraping for it
+            task.cancel()
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(gen(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+# ---------------------------------------------------------------------------
+# Async jobs: POST /jobs returns at once; the sheet is priced in the background on the
+# shared browser pool / limiter. Job state lives in SQLite and inputs/outputs on disk,
+# so unfinished jobs are resumed after a restart.
+# ---------------------------------------------------------------------------
+
+class JobStore:
+    FIELDS = (
+        "id", "filename", "engine", "status", "error", "created_at", "started_at",
+        "finished_at", "rows_total", "rows_done", "cache_hits", "blocks",
+    )
+
+    def __init__(self, db_path: str = JOBS_DB_PATH, jobs_dir: str = JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, filename TEXT, engine TEXT, status TEXT, error TEXT, "
+            "created_at REAL, started_at REAL, finished_at REAL, "
+            "rows_total INTEGER DEFAULT 0, rows_done INTEGER DEFAULT 0, "
+            "cache_hits INTEGER DEFAULT 0, blocks INTEGER DEFAULT 0)"
+        )
+        self._db.commit()
+
+    def input_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.in")
+
+    def output_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.out.xlsx")
+
+    def create(self, filename: str, engine: str, raw: bytes) -> str:
+        job_id = uuid.uuid4().hex
+        with open(self.input_path(job_id), "wb") as f:
+            f.write(raw)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, filename, engine, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, filename, engine, "queued", time.time()),
+            )
+            self._db.commit()
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if not fields:
+            return
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(self.FIELDS, row)) if row else None
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def purge_expired(self, retention_hours: float = JOB_RETENTION_HOURS) -> int:
+        """Deletes finished jobs older than the retention, with their input/output files."""
+        cutoff = time.time() - retention_hours * 3600
+        with self._lock:
+            ids = [r[0] for r in self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND COALESCE(finished_at, created_at) < ?",
+                (cutoff,),
+            ).fetchall()]
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+        for job_id in ids:
+            for path in (self.input_path(job_id), self.output_path(job_id)):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        return len(ids)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+job_store: Optional[JobStore] = None
+_job_slots = asyncio.Semaphore(MAX_RUNNING_JOBS)
+_job_tasks: dict = {}
+
+
+async def run_job(job_id: str):
+    async with _job_slots:
+        job = job_store.get(job_id)
+        if job is None:
+            return
+        try:
+            with open(job_store.input_path(job_id), "rb") as f:
+                raw = f.read()
+            df = await run_blocking(load_sheet, raw, job["filename"])
+        except HTTPException as e:
+            job_store.update(job_id, status="failed", error=str(e.detail), finished_at=time.time())
+            return
+        except Exception as e:
+            job_store.update(job_id, status="failed", error=f"Could not read sheet: {e}", finished_at=time.time())
+            return
+
+        progress = {"rows_done": 0}
+        stats: dict = {}
+        job_store.update(job_id, status="running", started_at=time.time(), rows_total=len(df), rows_done=0)
+
+        def on_rows(rows: List[int], _res: tuple, _elapsed: Optional[float]):
+            progress["rows_done"] += len(rows)
+            job_store.update(
+                job_id,
+                rows_done=progress["rows_done"],
+                cache_hits=stats.get("cache_hits", 0),
+                blocks=stats.get("blocked", 0),
+            )
+
+        try:
+            await price_dataframe(df, engine=job["engine"], on_rows=on_rows, stats=stats)
+            await run_blocking(write_workbook, df, job_store.output_path(job_id))
+        except Exception as e:
+            job_store.update(job_id, status="failed", error=str(e), finished_at=time.time())
+            return
+
+        job_store.update(
+            job_id,
+            status="done",
+            rows_done=len(df),
+            cache_hits=stats.get("cache_hits", 0),
+            blocks=stats.get("blocked", 0),
+            finished_at=time.time(),
         )
-        page = await context.new_page()
-
-        # Light rate limiting to reduce blocks
-        for idx in range(len(df)):
-            item = str(df.at[idx, "Item"]) if "Item" in df.columns else ""
-            grade = clean_grade(df.at[idx, "Grade"]) if "Grade" in df.columns else None
-
-            q = build_query(item, grade)
-            avg, comps, notes, url = await scrape_130point_for_query(page, q)
-
-            df.at[idx, "Avg Sold Price (90d, USD)"] = "" if avg is None else avg
-            df.at[idx, "# Sold Comps (90d)"] = int(comps)
-            df.at[idx, "Source"] = SOURCE_NAME
-            df.at[idx, "Query Used"] = url or q
-            df.at[idx, "Notes"] = notes
-
-            # polite delay (important)
-            await asyncio.sleep(0.6)
-
-        await context.close()
-        await browser.close()
-
-    out = BytesIO()
-    with pd.ExcelWriter(out, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False)
-    out.seek(0)
-
-    out_name = "priced_" + (file.filename or "cards.xlsx")
-    return StreamingResponse(
-        out,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{out_name}"'},
+
+
+async def purge_jobs_periodically(interval: float = JOB_PURGE_INTERVAL):
+    # Retention applies to long-running processes too, not just at startup
+    while True:
+        await run_blocking(job_store.purge_expired)
+        await asyncio.sleep(interval)
+
+
+def start_job(job_id: str):
+    task = asyncio.create_task(run_job(job_id))
+    _job_tasks[job_id] = task
+    task.add_done_callback(lambda _t: _job_tasks.pop(job_id, None))
+
+
+def job_view(job: dict) -> dict:
+    view = dict(job)
+    eta = None
+    done, total = job["rows_done"] or 0, job["rows_total"] or 0
+    if job["status"] == "running" and job["started_at"] and done:
+        elapsed = time.time() - job["started_at"]
+        eta = round(elapsed / done * (total - done), 1)
+    view["eta_seconds"] = eta
+    # "open"/"half_open" means the job is paused waiting out an upstream block
+    view["upstream_breaker"] = upstream_breaker.state
+    return view
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...), engine: str = SCRAPE_ENGINE):
+    check_engine(engine)
+    raw = await read_upload(file)
+    job_id = job_store.create(file.filename or "cards.xlsx", engine, raw)
+    start_job(job_id)
+    return {"id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job_view(job)
+
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}.")
+    return FileResponse(
+        job_store.output_path(job_id),
+        media_type=XLSX_MEDIA_TYPE,
+        filename=output_name(job["filename"]),
     )